@@ -154,6 +154,42 @@ class TestLoadAndParse(unittest.TestCase):
         self.assertEqual(sr.formulae, {"eth0": ("label", "somestring")})
         self.assertEqual(sr.rules, [])
 
+    def test_whitespace(self):
+
+        fd = StringIO('  eth0 : mac = "AB:CD:EF:AB:CD:EF"  \n'
+                      'eth1\t:\tlabel\t=\tsome=string')
+        sr = StaticRules(fd = fd)
+
+        self.assertTrue(sr.load_and_parse())
+        self.assertEqual(sr.formulae, {"eth0": ("mac", "AB:CD:EF:AB:CD:EF"),
+                                       "eth1": ("label", "some=string")})
+        self.assertEqual(sr.rules, [])
+
+    def test_only_newline_splits_lines(self):
+
+        fd = StringIO('eth0:label="a\x0cb c"\r\n'
+                      'eth1:label="d"')
+        sr = StaticRules(fd = fd)
+
+        self.assertTrue(sr.load_and_parse())
+        self.assertEqual(sr.formulae, {"eth0": ("label", "a\x0cb c"),
+                                       "eth1": ("label", "d")})
+        self.assertEqual(sr.rules, [])
+
+    def test_invalid_lines(self):
+
+        fd = StringIO('eth0:mac\n'
+                      'eth1=\n'
+                      'eth2:="foo"\n'
+                      'ethx:label="foo"\n'
+                      'eth:label="foo"\n'
+                      'side-1-eth3:label="foo"')
+        sr = StaticRules(fd = fd)
+
+        self.assertTrue(sr.load_and_parse())
+        self.assertEqual(sr.formulae, {})
+        self.assertEqual(sr.rules, [])
+
 class TestLoadAndParseGuess(unittest.TestCase):
 
     def setUp(self):
@@ -269,6 +305,16 @@ class TestGenerate(unittest.TestCase):
 
         self.assertEqual(sr.rules, [])
 
+    def test_single_invalid_mac(self):
+
+        sr = StaticRules()
+        sr.formulae = {"eth0": ("mac", "foo")}
+        sr.generate(self.state)
+
+        self.assertEqual(sr.rules, [])
+        self.assertIn("No NIC found with a MAC address of 'foo'",
+                      self.logbuf.getvalue())
+
     def test_single_mac_matching(self):
 
         fd = StringIO('eth0:mac="01:23:45:67:89:0a"')
@@ -281,6 +327,18 @@ class TestGenerate(unittest.TestCase):
                 MACPCI("01:23:45:67:89:0a", "0000:00:01.0", tname="eth0")
                 ])
 
+    def test_single_mac_matching_first(self):
+
+        fd = StringIO('eth0:mac="03:23:45:67:89:0A"')
+        sr = StaticRules(fd = fd)
+        self.assertTrue(sr.load_and_parse())
+
+        sr.generate(self.state)
+
+        self.assertEqual(sr.rules,[
+                MACPCI("03:23:45:67:89:0a", "0000:00:10.0", tname="eth0")
+                ])
+
     def test_single_pci_matching(self):
 
         fd = StringIO('eth0:pci="0000:00:10.0"')
@@ -474,3 +532,18 @@ class TestSave(unittest.TestCase):
             )
 
         self.assertEqual(sr.write(False), desired_result)
+
+    def test_numeric_order(self):
+
+        sr = StaticRules()
+        sr.formulae = {"eth10": ("ppn", "p1p1"),
+                       "eth2": ("label", "Ethernet1"),
+                       "ethx": ("label", "Ethernet2"),
+                       }
+
+        desired_result = (
+            "eth2:label=\"Ethernet1\"\n"
+            "eth10:ppn=\"p1p1\"\n"
+            )
+
+        self.assertEqual(sr.write(False), desired_result)
@@ -50,16 +50,28 @@ import re
 from xcp.compat import open_with_codec_handling
 from xcp.logger import LOG
 from xcp.net.ifrename.macpci import MACPCI
+from xcp.net.mac import MAC
 from xcp.net.mac import VALID_COLON_MAC as VALID_MAC
 from xcp.pci import VALID_SBDFI as VALID_PCI
 from xcp.pci import pci_sbdfi_to_nic
 
-VALID_LINE = re.compile(
-    r"^\s*(?P<target>eth\d+)"         # <target name>
-    r"\s*(?::\s*(?P<method>[^=]+?))?" # Optional Colon <id method>
-    r"\s*="                           # Equals
-    r"\s*(?P<val>.+)$"                # "value" (quotes optional)
-    )
+# Performance profile: reading and generating rules is dominated by file I/O
+# and Python interpreter overhead, not computation, so optimisations here
+# target allocation counts, regex compilation and matching, and linear scans
+# of the NIC state in generate().
+
+# Python 2 has no re.ASCII, but its unicode patterns are only Unicode-aware
+# when re.UNICODE is given, so no flag is needed there.
+_RE_ASCII = getattr(re, "ASCII", 0)
+
+_PPN_RE = re.compile(r"\A(?:em\d+|p(?:ci)?\d+p\d+)\Z", _RE_ASCII)
+
+# All the validators as a single alternation, tried in order, so guessing the
+# method of a value takes one match.  The named group which matched is the
+# method.  VALID_PCI is a verbose pattern, hence re.X.
+_GUESS_RE = re.compile(r"(?P<mac>%s)|(?P<pci>%s)|(?P<ppn>%s)"
+                       % (VALID_MAC.pattern, VALID_PCI.pattern, _PPN_RE.pattern),
+                       re.X | _RE_ASCII)
 
 # pylint: disable-next=line-too-long
 SAVE_HEADER = """# Static rules.  Autogenerated by the installer from the answerfile or previous install
@@ -78,6 +90,20 @@ SAVE_HEADER = """# Static rules.  Autogenerated by the installer from the answer
 
 """
 
+_DIGITS = frozenset("0123456789")
+
+def _valid_target(name):
+    """Whether name is a valid target name, i.e. of the form eth<digits>"""
+    index = name[3:]
+    return name.startswith("eth") and index != "" and _DIGITS.issuperset(index)
+
+def _iter_lines(raw_lines):
+    """Yield (number, stripped line) pairs, skipping blank lines and comments"""
+    for num, line in enumerate(raw_lines):
+        line = line.strip()
+        if line and line[0] != "#":
+            yield num, line
+
 class StaticRules(object):
     """
     Object for parsing the static rules configuration.
@@ -87,10 +113,10 @@ class StaticRules(object):
     to read them.
     """
 
-    methods = ["mac", "pci", "ppn", "label", "guess"]
+    methods = frozenset(("mac", "pci", "ppn", "label", "guess"))
     validators = { "mac": VALID_MAC,
                    "pci": VALID_PCI,
-                   "ppn": re.compile(r"^(?:em\d+|p(?:ci)?\d+p\d+)$")
+                   "ppn": _PPN_RE,
                    }
 
     def __init__(self, path=None, fd=None):
@@ -117,11 +143,11 @@ class StaticRules(object):
                                   % (self.path,))
                         return False
                     fd = open_with_codec_handling(self.path, "r")
-                    raw_lines = fd.readlines()
+                    raw_lines = fd.read().split("\n")
 
                 # else if we were given a file descriptor, just read it
                 elif self.fd:
-                    raw_lines = self.fd.readlines()
+                    raw_lines = self.fd.read().split("\n")
 
                 # else there is nothing we can do
                 else:
@@ -136,58 +162,54 @@ class StaticRules(object):
             if fd:
                 fd.close()
 
-        # Generator to strip blank lines and line comments
-        lines = ( (n, l.strip()) for (n, l) in enumerate(raw_lines)
-                  if (len(l.strip()) and l.strip()[0] != '#') )
+        methods = StaticRules.methods
+        validators = StaticRules.validators
 
+        for num, line in _iter_lines(raw_lines):
+            # Split into <target name>[: <id method>] = "value".  The line
+            # is already stripped, so target can only have trailing
+            # whitespace and value only leading whitespace.
+            lhs, equals, value = line.partition("=")
+            target, colon, method = lhs.partition(":")
+            target = target.rstrip()
+            method = method.strip()
+            value = value.lstrip()
 
-        for num, line in lines:
             # Check the line is valid
-            res = VALID_LINE.match(line)
-            if res is None:
+            if (not equals or not value or (colon and not method)
+                    or not _valid_target(target)):
                 LOG.warning("Unrecognised line '%s' in static rules (line %d)"
                             % (line, num))
                 continue
 
-            groups = res.groupdict()
-
-            target = groups["target"].strip()
-
-            if groups["method"] is None:
+            if not colon:
                 # As method is optional, set to 'guess' if not present
                 method = "guess"
                 LOG.debug("Guessing method for interface %s on line %d"
                           % (target, num) )
-            else:
-                method = groups["method"].strip()
 
-            value = groups["val"].strip()
-            if value[0] == value[-1] and value[0] in ("'", '"'):
+            if len(value) > 1 and value[0] in "'\"" and value[-1] == value[0]:
                 value = value[1:-1]
                 # If we should guess the value, quotes imply a label
                 if value == "guess":
                     value = "label"
 
             # Check that it is a recognised method
-            if method not in StaticRules.methods:
+            if method not in methods:
                 LOG.warning("Unrecognised static identification method "
                             "'%s' on line %d - Ignoring" % (method, num))
                 continue
 
             # If we need to guess the method from the value
             if method == "guess":
-                for k, v in StaticRules.validators.items():
-                    if v.match(value) is not None:
-                        method = k
-                        break
-                else:
-                    # If no validators, assume label
-                    method = "label"
+                res = _GUESS_RE.match(value)
+                # If no validators match, assume label
+                method = res.lastgroup if res is not None else "label"
 
             # If we have a validator, test the valididy
             else:
-                if method in StaticRules.validators:
-                    if StaticRules.validators[method].match(value) is None:
+                if method in validators:
+                    if validators[method].match(value) is None:
                         LOG.warning("Invalid %s value '%s' on line %d - Ignoring"
                                     % (method, value, num))
                         continue
@@ -214,113 +236,101 @@ class StaticRules(object):
         Make rules from the formulae based on global state.
         """
 
-        # CA-75599 - check that state has no shared ppns.
-        #  See net.biodevname.has_ppn_quirks() for full reason
-        ppns = [ x.ppn for x in state if x.ppn is not None ]
-        ppn_quirks = ( len(ppns) != len(set(ppns)) )
+        # Index the state by each identification method, keeping the first
+        # NIC for each key as a linear search of the state would find.  MACs
+        # are keyed by their normalised string form.
+        by_mac = {}  # type: dict[str, MACPCI]
+        by_ppn = {}  # type: dict[str, MACPCI]
+        by_label = {}  # type: dict[str, MACPCI]
+        ppn_quirks = False
+        for nic in state:
+            by_mac.setdefault(str(nic.mac), nic)
+            if nic.ppn is not None:
+                # CA-75599 - check that state has no shared ppns.
+                #  See net.biodevname.has_ppn_quirks() for full reason
+                if nic.ppn in by_ppn:
+                    ppn_quirks = True
+                else:
+                    by_ppn[nic.ppn] = nic
+            if nic.label is not None:
+                by_label.setdefault(nic.label, nic)
 
         if ppn_quirks:
             LOG.warning("Discovered physical policy naming quirks in provided "
                         "state.  Disabling 'method=ppn' generation")
 
+        lookups = { "mac": (by_mac, "a MAC address"),
+                    "ppn": (by_ppn, "a ppn"),
+                    "label": (by_label, "an SMBios Label"),
+                    }
+
         for target, (method, value) in self.formulae.items():
 
-            if method == "mac":
-
-                for nic in state:
-                    if nic.mac == value:
-                        try:
-                            rule = MACPCI(nic.mac, nic.pci, tname=target)
-                        except Exception as e:
-                            LOG.warning("Error creating rule: %s" % (e,))
-                            continue
-                        self.rules.append(rule)
-                        break
-                else:
-                    LOG.warning("No NIC found with a MAC address of '%s' for "
-                                "the %s static rule" % (value, target))
+            if method == "ppn" and ppn_quirks:
+                LOG.info("Not considering formula for '%s' due to ppn "
+                         "quirks" % (target,))
                 continue
 
-            if method == "ppn":
+            try:
+                if method == "pci":
+                    nic = pci_sbdfi_to_nic(value, state)
 
-                if ppn_quirks:
-                    LOG.info("Not considering formula for '%s' due to ppn "
-                             "quirks" % (target,))
-                    continue
+                elif method in lookups:
+                    nics, description = lookups[method]
+                    key = value
+                    if method == "mac":
+                        # An unrecognised MAC address cannot match any NIC
+                        key = str(MAC(value)) if MAC.is_valid(value) else None
+                    nic = nics.get(key)
+                    if nic is None:
+                        LOG.warning("No NIC found with %s of '%s' for the %s "
+                                    "static rule" % (description, value, target))
+                        continue
 
-                for nic in state:
-                    if nic.ppn == value:
-                        try:
-                            rule = MACPCI(nic.mac, nic.pci, tname=target)
-                        except Exception as e:
-                            LOG.warning("Error creating rule: %s" % (e,))
-                            continue
-                        self.rules.append(rule)
-                        break
                 else:
-                    LOG.warning("No NIC found with a ppn of '%s' for the "
-                                "%s static rule" % (value, target))
-                continue
-
-            if method == "pci":
-                try:
-                    nic = pci_sbdfi_to_nic(value, state)
-                    rule = MACPCI(nic.mac, nic.pci, tname=target)
-                except Exception as e:
-                    LOG.warning("Error creating rule: %s" % (e,))
+                    LOG.critical("Unknown static rule method %s" % method)
                     continue
-                self.rules.append(rule)
-
-                continue
 
-            if method == "label":
-
-                for nic in state:
-                    if nic.label == value:
-                        try:
-                            rule = MACPCI(nic.mac, nic.pci, tname=target)
-                        except Exception as e:
-                            LOG.warning("Error creating rule: %s" % (e,))
-                            continue
-                        self.rules.append(rule)
-                        break
-                else:
-                    LOG.warning("No NIC found with an SMBios Label of '%s' for "
-                                "the %s static rule" % (value, target))
+                rule = MACPCI(nic.mac, nic.pci, tname=target)
+            except Exception as e:
+                LOG.warning("Error creating rule: %s" % (e,))
                 continue
-
-            LOG.critical("Unknown static rule method %s" % method)
+            self.rules.append(rule)
 
     def write(self, header = True):
         """
         Write the static rules to a string
         """
 
-        res = ""
+        parts = []
+        methods = StaticRules.methods
+        validators = StaticRules.validators
 
         if header:
-            res += SAVE_HEADER
+            parts.append(SAVE_HEADER)
 
-        keys = list(set((x for x in self.formulae if x.startswith("eth"))))
-        keys.sort(key=lambda x: int(x[3:]))
+        # formulae may have been filled in directly rather than parsed, so
+        # the targets still need checking before their index is used.
+        keys = sorted((int(x[3:]), x) for x in self.formulae
+                      if _valid_target(x))
 
-        for target in keys:
+        for _, target in keys:
             method, value = self.formulae[target]
 
-            if method not in StaticRules.methods:
+            if method not in methods:
                 LOG.warning("Method %s not recognised.  Ignoring" % (method,))
                 continue
 
             # If we have a validator, test the valididy
-            if method in StaticRules.validators:
-                if StaticRules.validators[method].match(value) is None:
+            if method in validators:
+                if validators[method].match(value) is None:
                     LOG.warning("Invalid %s value '%s'. Ignoring"
                                 % (method, value))
                     continue
 
-            res += "%s:%s=\"%s\"\n" % (target, method, value)
+            parts.append("%s:%s=\"%s\"\n" % (target, method, value))
 
-        return res
+        return "".join(parts)
 
     def save(self, header = True):
         """